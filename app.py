@@ -1,37 +1,124 @@
-from flask import Flask, request, jsonify, send_from_directory, url_for
+from flask import Flask, Request, Response, request, send_from_directory, url_for
+from markupsafe import escape
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-from sqlalchemy import text
+from flask_caching import Cache
+from sqlalchemy import and_, bindparam, insert, or_, text, tuple_
+from sqlalchemy.exc import DBAPIError, OperationalError, TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.sql import expression
+from sqlalchemy.ext.compiler import compiles
 import os
 import logging
-from datetime import datetime
-import uuid
+import logging.handlers
+from datetime import datetime, timedelta, timezone
+from werkzeug.exceptions import HTTPException
 from werkzeug.utils import secure_filename
+from werkzeug.middleware.proxy_fix import ProxyFix
 import cloudinary
 import cloudinary.uploader
+import cloudinary.api
+import cloudinary.utils
 from PIL import Image
 import io
 import time
+import base64
+import binascii
+import orjson
+import hashlib
+import queue
+import threading
+import atexit
+import copy
+import tempfile
+import re
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+IN_MEMORY_UPLOAD_LIMIT = 1024 * 1024  # bodies up to this size are parsed in memory
+
+class InMemoryUploadRequest(Request):
+    """Request that keeps multipart file parts of small bodies in memory.
+
+    Werkzeug spools parts of bodies over 500KB to a temporary file, which the
+    upload routes then read straight back into memory. Raising that cutoff to
+    1MB keeps typical uploads off the disk, while a gevent worker with
+    hundreds of connections still can't buffer 16MB bodies for all of them.
+    """
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if total_content_length is not None and total_content_length <= IN_MEMORY_UPLOAD_LIMIT:
+            return io.BytesIO()
+        return tempfile.TemporaryFile("rb+")
 
 # Initialize Flask
 app = Flask(__name__)
+app.request_class = InMemoryUploadRequest
+# PROXY_FIX_X_FOR is the number of proxies in front that append to
+# X-Forwarded-For (1 for Render's router). Only then take the client address
+# and scheme from the X-Forwarded-* headers, so remote_addr is right for rate
+# limits and external URLs come out as https; without a proxy those headers
+# come straight from the client and would let it pick its own rate-limit key.
+PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR', 0))
+if PROXY_FIX_X_FOR > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_FIX_X_FOR, x_proto=1)
+
+# Behind nginx/Apache, let the proxy stream files with sendfile(2) instead of
+# a Python worker: USE_X_SENDFILE=1 makes send_from_directory emit X-Sendfile,
+# X_ACCEL_REDIRECT_PREFIX (an nginx "internal" location) covers the static images
+app.use_x_sendfile = os.environ.get('USE_X_SENDFILE') == '1'
+X_ACCEL_REDIRECT_PREFIX = os.environ.get('X_ACCEL_REDIRECT_PREFIX')
 
 # Enable CORs
 CORS(app)
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+class DeferredFormatQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener's handler.
+
+    The stock prepare() runs the full format (tracebacks included) on the
+    calling thread; here only the message args are merged, so they can't
+    change before the listener writes the record.
+    """
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+# Configure logging: request threads only merge the message and enqueue the
+# record; a listener thread formats it (tracebacks too) and does the write(),
+# so no request blocks on the handler lock.
+# Production skips INFO records entirely unless LOG_LEVEL says otherwise.
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'WARNING' if os.environ.get('FLASK_ENV') == 'production' else 'INFO')
+log_queue = queue.SimpleQueue()
+log_stream_handler = logging.StreamHandler()
+log_stream_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+log_listener = logging.handlers.QueueListener(log_queue, log_stream_handler)
+log_listener.start()
+atexit.register(log_listener.stop)
+logging.basicConfig(level=LOG_LEVEL, handlers=[DeferredFormatQueueHandler(log_queue)])
 
-# Rate limiting
+REDIS_URL = os.environ.get("REDIS_URL")
+
+# Rate limiting: with Redis the counters are shared by every worker and the
+# moving window is checked by a single atomic Lua script; memory:// is per-process
 limiter = Limiter(
     key_func=get_remote_address,
     app=app,
     default_limits=["200 per day", "50 per hour"],
-    storage_uri="memory://"
+    storage_uri=REDIS_URL or "memory://",
+    strategy="moving-window"
 )
 
+# Response caching: shared through Redis when REDIS_URL is set, otherwise
+# per-process memory (entries still expire after CACHE_DEFAULT_TIMEOUT)
+cache = Cache(app, config={
+    "CACHE_TYPE": "RedisCache" if REDIS_URL else "SimpleCache",
+    "CACHE_REDIS_URL": REDIS_URL,
+    "CACHE_DEFAULT_TIMEOUT": 30
+})
+
 # --- Configure Cloudinary ---
 try:
     cloudinary.config(
@@ -46,111 +133,633 @@ try:
         cloudinary.api.ping()
         app.logger.info("Cloudinary connection test successful.")
     except Exception as e:
-        app.logger.warning(f"Cloudinary connection test failed: {e}")
+        app.logger.warning("Cloudinary connection test failed: %s", e)
         
 except Exception as e:
-    app.logger.error(f"FATAL: Cloudinary configuration failed. Check environment variables. Error: {e}")
+    app.logger.error("FATAL: Cloudinary configuration failed. Check environment variables. Error: %s", e)
 
 # Configure database
 DATABASE_URL = os.environ.get("DATABASE_URL")
 if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+if DATABASE_URL and DATABASE_URL.startswith("postgresql") and "sslmode" not in DATABASE_URL:
+    # Never fall back to plaintext; an explicit sslmode in the URL still wins
+    DATABASE_URL += ("&" if "?" in DATABASE_URL else "?") + "sslmode=require"
 
 app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
-db = SQLAlchemy(app)
+# Configure connection pooling
+if DATABASE_URL and DATABASE_URL.startswith("sqlite"):
+    # A single shared connection; SQLite serializes writers anyway
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        "poolclass": StaticPool,
+        "connect_args": {"check_same_thread": False},
+    }
+elif DATABASE_URL and DATABASE_URL.startswith("postgresql"):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        # Keep warm connections so requests skip the TCP/TLS/auth handshake.
+        # Every gunicorn worker has its own pool, so the server may see up to
+        # WEB_CONCURRENCY * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections; keep
+        # that under its max_connections. Extra requests wait pool_timeout.
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", 5)),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 5)),
+        "pool_timeout": 30,
+        "pool_pre_ping": True,
+        # Under Render's 5-minute idle kill, so a pooled connection is never dead on checkout
+        "pool_recycle": 280,
+        # Reuse the most recent connection, letting the rest of the pool idle out
+        "pool_use_lifo": True,
+        # Let psycopg2 collapse multi-row INSERT/UPDATE batches into single round-trips
+        "executemany_mode": "values_plus_batch",
+        "insertmanyvalues_page_size": 1000,
+    }
+
+# Writes always commit explicitly and reads never follow pending changes, so
+# skip the flush check before every query
+db = SQLAlchemy(app, session_options={"autoflush": False})
+
+class utcnow(expression.FunctionElement):
+    """Current UTC time as a server-side column default"""
+    type = db.DateTime()
+    inherit_cache = True
+
+@compiles(utcnow)
+def _default_utcnow(element, compiler, **kw):
+    return "CURRENT_TIMESTAMP"
+
+@compiles(utcnow, 'postgresql')
+def _pg_utcnow(element, compiler, **kw):
+    return "TIMEZONE('utc', CURRENT_TIMESTAMP)"
+
+@compiles(utcnow, 'sqlite')
+def _sqlite_utcnow(element, compiler, **kw):
+    # Same text format SQLAlchemy writes, so DATETIME comparisons stay consistent
+    return "STRFTIME('%Y-%m-%d %H:%M:%f000', 'now')"
 
 # Database model
+GALLERY_INDEX_INCLUDE = ["image_url", "original_filename", "file_size", "image_width", "image_height"]
+
 class Upload(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String(255), nullable=False)
     original_filename = db.Column(db.String(255), nullable=False)
-    image_url = db.Column(db.String(500), nullable=False)
+    image_url = db.Column(db.String(500))  # NULL until the Cloudinary upload finishes
     file_size = db.Column(db.Integer)
     image_width = db.Column(db.Integer)
     image_height = db.Column(db.Integer)
-    uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
+    uploaded_at = db.Column(db.DateTime, server_default=utcnow(), nullable=False)
     ip_address = db.Column(db.String(45))
     user_agent = db.Column(db.String(500))
+    status = db.Column(db.String(16), server_default='ready', nullable=False)  # pending, ready or failed
+    file_type = db.Column(db.String(8), index=True)  # extension, denormalized for /stats
+    content_hash = db.Column(db.String(64), index=True)  # SHA-256 of the bytes; NULL for direct uploads
+
+    __table_args__ = (
+        # Serves the gallery's keyset pagination without a sort step. Partial on
+        # status so the gallery's filter needs no heap lookup, and on Postgres
+        # the INCLUDE columns let the page be read from the index alone
+        db.Index(
+            "ix_upload_gallery", uploaded_at.desc(), id.desc(),
+            postgresql_include=GALLERY_INDEX_INCLUDE,
+            postgresql_where=status == 'ready',
+            sqlite_where=status == 'ready'
+        ),
+        db.Index("ix_upload_ip", "ip_address"),
+        # Background uploads finish their row by public_id
+        db.Index("ix_upload_filename", "filename"),
+        # Finds abandoned pending rows to expire; stays tiny
+        db.Index(
+            "ix_upload_pending", uploaded_at,
+            postgresql_where=status == 'pending',
+            sqlite_where=status == 'pending'
+        ),
+    )
+
+# In-place changes for tables created by older versions; each must be idempotent.
+# They take ACCESS EXCLUSIVE locks, so keep them to catalog-only changes
+POSTGRES_SCHEMA_UPGRADES = [
+    # Server-side default, stored in UTC like the old datetime.utcnow default
+    "ALTER TABLE upload ALTER COLUMN uploaded_at SET DEFAULT TIMEZONE('utc', CURRENT_TIMESTAMP)",
+    # Rows are written before the background Cloudinary upload has a URL
+    "ALTER TABLE upload ALTER COLUMN image_url DROP NOT NULL",
+    "ALTER TABLE upload ADD COLUMN IF NOT EXISTS status VARCHAR(16) NOT NULL DEFAULT 'ready'",
+    "ALTER TABLE upload ADD COLUMN IF NOT EXISTS file_type VARCHAR(8)",
+    "ALTER TABLE upload ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+]
+
+# Data backfills, run after the upgrades commit and the indexes are built (the
+# file_type index finds each slice's NULL rows). Each statement handles one
+# slice and commits on its own, so only row locks are held, briefly; it is
+# repeated until it touches no rows
+POSTGRES_BACKFILLS = [
+    # file_type as get_file_type() would have stored it
+    "UPDATE upload SET file_type = COALESCE(LEFT(LOWER(SUBSTRING(original_filename FROM '\\.([^.]*)$')), 8), 'unknown') "
+    "WHERE id IN (SELECT id FROM upload WHERE file_type IS NULL LIMIT 10000)",
+]
+
+# Index changes on live tables; CONCURRENTLY keeps uploads writable while they
+# build, but can't run inside a transaction. An interrupted build leaves an
+# INVALID index behind that IF NOT EXISTS would skip, so those are dropped first
+INVALID_UPLOAD_INDEXES = (
+    "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+    "WHERE i.indrelid = 'upload'::regclass AND NOT i.indisvalid"
+)
+POSTGRES_CONCURRENT_INDEX_CHANGES = [
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_upload_gallery ON upload (uploaded_at DESC, id DESC) "
+    f"INCLUDE ({', '.join(GALLERY_INDEX_INCLUDE)}) WHERE status = 'ready'",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_upload_ip ON upload (ip_address)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_upload_filename ON upload (filename)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_upload_file_type ON upload (file_type)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_upload_content_hash ON upload (content_hash)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_upload_pending ON upload (uploaded_at) WHERE status = 'pending'",
+    # Superseded by ix_upload_gallery
+    "DROP INDEX CONCURRENTLY IF EXISTS ix_upload_uploaded_at_id",
+]
+
+UPLOAD_NEVER_ANALYZED = "SELECT reltuples < 0 FROM pg_class WHERE relname = 'upload'"
+
+# Schema setup is idempotent but takes locks and inspects the table, so under
+# gunicorn it runs once in the master (see gunicorn.conf.py) and workers skip it
+RUN_MIGRATIONS = os.environ.get('RUN_MIGRATIONS', '1') == '1'
+
+def init_database():
+    """Create tables, apply in-place upgrades and build missing indexes"""
+    db.create_all()
+    # create_all() skips column changes and indexes on tables that already exist
+    if db.engine.dialect.name == 'postgresql':
+        with db.engine.begin() as conn:
+            for statement in POSTGRES_SCHEMA_UPGRADES:
+                conn.execute(text(statement))
+        backfilled = 0
+        with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for name in conn.execute(text(INVALID_UPLOAD_INDEXES)).scalars().all():
+                app.logger.warning("Dropping invalid index %s left by an interrupted build", name)
+                conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"'))
+            for statement in POSTGRES_CONCURRENT_INDEX_CHANGES:
+                conn.execute(text(statement))
+            for statement in POSTGRES_BACKFILLS:
+                while (updated := conn.execute(text(statement)).rowcount) > 0:
+                    backfilled += updated
+            # Fresh planner stats after a backfill, or for a table never analyzed,
+            # so the gallery query picks the covering index
+            if backfilled or conn.execute(text(UPLOAD_NEVER_ANALYZED)).scalar():
+                conn.execute(text("ANALYZE upload"))
+    else:
+        for index in Upload.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+    app.logger.info("Database tables created successfully.")
+
+@app.cli.command("init-db")
+def init_db_command():
+    """Create or upgrade the database schema"""
+    init_database()
 
-# Create tables at startup
 with app.app_context():
+    if RUN_MIGRATIONS:
+        try:
+            init_database()
+        except Exception as e:
+            app.logger.error("Database initialization failed: %s", e)
+
+    # Pre-create a pooled connection so the first request doesn't pay the handshake
     try:
-        db.create_all()
-        app.logger.info("Database tables created successfully.")
+        db.engine.connect().close()
     except Exception as e:
-        app.logger.error(f"Database initialization failed: {e}")
+        app.logger.warning("Database pool warm-up failed: %s", e)
+
+    # If the app is preloaded, workers fork after this point; never share pooled sockets
+    os.register_at_fork(after_in_child=lambda engine=db.engine: engine.dispose(close=False))
+
+def ojsonify(obj, status=200):
+    """JSON response encoded with orjson (native datetime support, returns bytes)"""
+    return Response(orjson.dumps(obj, option=orjson.OPT_NAIVE_UTC), status=status, mimetype="application/json")
+
+# No SVG: its contents can't pass the raster signature check
+SUPPORTED_FORMATS = ('png', 'jpg', 'jpeg', 'gif', 'bmp', 'webp', 'tiff')
+ALLOWED_EXTENSIONS = frozenset(SUPPORTED_FORMATS)
+UNSUPPORTED_TYPE_MESSAGE = f"File type not supported. Supported types: {', '.join(SUPPORTED_FORMATS)}"
+
+def file_extension(filename):
+    """Lowercased text after the last dot, or None without one"""
+    dot = filename.rfind('.')  # slice instead of rsplit's list allocation
+    return filename[dot + 1:].lower() if dot >= 0 else None
 
 def allowed_file(filename):
-    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'webp', 'tiff', 'svg'}
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return file_extension(filename) in ALLOWED_EXTENSIONS
 
 def get_file_type(filename):
-    """Get file type from filename"""
-    if '.' not in filename:
-        return 'unknown'
-    return filename.rsplit('.', 1)[1].lower()
+    """Get file type from filename, clipped to the column"""
+    return (file_extension(filename) or 'unknown')[:8]
+
+def clip_filename(filename, limit=255):
+    """Shorten a filename to limit characters, cutting the stem and keeping the extension"""
+    if len(filename) <= limit:
+        return filename
+    stem, dot, extension = filename.rpartition('.')
+    if not dot or len(extension) + 1 >= limit:
+        return filename[:limit]
+    return f"{stem[:limit - len(extension) - 1]}.{extension}"
 
-def validate_image_file(file_data):
-    """Validate and get image information"""
+IMAGE_HEADER_BYTES = 64 * 1024  # enough for the size fields of common formats
+
+# Leading bytes of the formats Pillow can read for us (WebP is RIFF....WEBP)
+IMAGE_SIGNATURES = (
+    b'\x89PNG\r\n\x1a\n', b'\xff\xd8\xff', b'GIF87a', b'GIF89a', b'BM', b'II*\x00', b'MM\x00*'
+)
+IMAGE_FORMATS = ("PNG", "JPEG", "GIF", "BMP", "WEBP", "TIFF")
+
+def has_image_signature(header):
+    return header.startswith(IMAGE_SIGNATURES) or (header[:4] == b'RIFF' and header[8:12] == b'WEBP')
+
+def validate_image_file(file_data, complete=True):
+    """Validate and get image information.
+
+    Only the header is parsed (Image.open is lazy), so a partial buffer works;
+    Cloudinary rejects bodies that turn out to be corrupt. Returns (None, None)
+    when an incomplete buffer ends before the size fields.
+    """
     try:
-        image = Image.open(io.BytesIO(file_data))
+        image = Image.open(io.BytesIO(file_data), formats=IMAGE_FORMATS)
         width, height = image.size
-        
-        # Check image dimensions (max 8000x8000 pixels)
-        if width > 8000 or height > 8000:
-            return None, "Image dimensions too large (max 8000x8000 pixels)"
-        
-        # Check if image is valid
-        image.verify()
-        
-        return {"width": width, "height": height}, None
     except Exception as e:
+        if not complete:
+            return None, None
         return None, f"Invalid image file: {str(e)}"
+        
+    # Check image dimensions (max 8000x8000 pixels)
+    if width > 8000 or height > 8000:
+        return None, "Image dimensions too large (max 8000x8000 pixels)"
+    
+    return {"width": width, "height": height}, None
+
+# Rejections that have a more specific status than 400
+UPLOAD_ERROR_STATUSES = {"FILE_TOO_LARGE": 413, "UNSUPPORTED_TYPE": 415}
 
-def optimize_image(file_data, max_size=(2048, 2048), quality=85):
-    """Optimize image before upload"""
+def upload_error_status(error):
+    return UPLOAD_ERROR_STATUSES.get(error["code"], 400)
+
+def read_upload_file(file):
+    """Read and validate an uploaded image, returning (file_data, image_info, error)"""
+    if file is None:
+        return None, None, {"error": "No file provided", "code": "NO_FILE"}
+    
+    if file.filename == '':
+        return None, None, {"error": "No file selected", "code": "EMPTY_FILENAME"}
+    
+    if not allowed_file(file.filename):
+        return None, None, {
+            "error": UNSUPPORTED_TYPE_MESSAGE, 
+            "code": "UNSUPPORTED_TYPE"
+        }
+
+    # Read file data
     try:
-        image = Image.open(io.BytesIO(file_data))
-        
-        # Convert to RGB if necessary
-        if image.mode in ('RGBA', 'LA', 'P'):
-            image = image.convert('RGB')
+        if isinstance(file.stream, io.BytesIO):
+            # InMemoryUploadRequest parts: getvalue() hands back the part's own
+            # buffer, so the upload exists once in memory from here to Cloudinary
+            file_data = file.stream.getvalue()
+        else:
+            file.stream.seek(0)
+            file_data = file.read()
+        file_size = len(file_data)
         
-        # Resize if too large
-        image.thumbnail(max_size, Image.Resampling.LANCZOS)
+        # Check file size (16MB limit)
+        if file_size > 16 * 1024 * 1024:
+            return None, None, {
+                "error": "File too large. Maximum size is 16MB", 
+                "code": "FILE_TOO_LARGE"
+            }
+            
+        if file_size < 100:  # Minimum 100 bytes
+            return None, None, {
+                "error": "File too small. Minimum size is 100 bytes", 
+                "code": "FILE_TOO_SMALL"
+            }
         
-        # Save optimized image
-        output = io.BytesIO()
-        image.save(output, format='JPEG', quality=quality, optimize=True)
-        output.seek(0)
+        # A renamed non-image is turned away on its magic bytes alone
+        if not has_image_signature(file_data):
+            return None, None, {
+                "error": "File contents are not a PNG, JPEG, GIF, BMP, WebP or TIFF image",
+                "code": "UNSUPPORTED_TYPE"
+            }
         
-        return output.getvalue()
+        # Validate image from its header; oversized dimensions are rejected
+        # without parsing the rest
+        complete = file_size <= IMAGE_HEADER_BYTES
+        image_info, validation_error = validate_image_file(file_data[:IMAGE_HEADER_BYTES], complete)
+        if image_info is None and validation_error is None:
+            # Large EXIF/ICC blocks can push the size fields past the header
+            image_info, validation_error = validate_image_file(file_data)
+            
     except Exception as e:
-        app.logger.warning(f"Image optimization failed: {e}")
-        return file_data
+        app.logger.error("File reading error: %s", e)
+        return None, None, {
+            "error": "Failed to read file", 
+            "code": "READ_ERROR"
+        }
 
-# --- ROUTES ---
+    if validation_error:
+        return None, None, {
+            "error": validation_error, 
+            "code": "INVALID_IMAGE"
+        }
 
-@app.route('/')
-def index():
-    if os.path.exists('index.html'):
-        return send_from_directory('.', 'index.html')
-    return jsonify({"error": "Frontend not found."}), 404
+    return file_data, image_info, None
 
-@app.route('/gallery')
-def view_uploads_gallery():
+CHUNKED_UPLOAD_THRESHOLD = 5 * 1024 * 1024
+CHUNKED_UPLOAD_SIZE = 6 * 1024 * 1024
+
+# Incoming transformation: Cloudinary clamps the dimensions and picks the
+# encoding in one pass, so nothing is resized or re-encoded locally
+UPLOAD_TRANSFORMATION = [
+    {"width": 2048, "height": 2048, "crop": "limit"},
+    {"quality": "auto:good"},
+    {"fetch_format": "auto"}
+]
+
+def upload_to_cloudinary(file_data, public_id=None):
+    """Push the raw image bytes to Cloudinary, chunked for large files"""
+    options = {
+        "public_id": public_id,
+        "transformation": UPLOAD_TRANSFORMATION,
+        "resource_type": "auto"
+    }
+    if len(file_data) > CHUNKED_UPLOAD_THRESHOLD:
+        # Sent as 6MB parts, so one request body never holds the whole file
+        return cloudinary.uploader.upload_large(io.BytesIO(file_data), chunk_size=CHUNKED_UPLOAD_SIZE, **options)
+    return cloudinary.uploader.upload(file_data, **options)
+
+# Cheap shape check so a malformed X-Forwarded-For never reaches the VARCHAR(45) column
+is_ip_address = re.compile(r"^[0-9a-fA-F:.]{1,45}$").match
+
+def get_client_ip():
+    """Client address as resolved by ProxyFix, None if it isn't IP-shaped"""
+    client_ip = request.remote_addr
+    return client_ip if client_ip and is_ip_address(client_ip) else None
+
+def build_upload_row(filename, file_size, image_info, upload_result, content_hash=None):
+    """Build the column mapping for a new Upload row"""
+    # Get client information
+    client_ip = get_client_ip()
+    user_agent = request.headers.get('User-Agent', '')[:500]  # Limit length
+    original_filename = clip_filename(secure_filename(filename))  # fits the column
+    
+    return {
+        "filename": upload_result['public_id'],
+        "original_filename": original_filename,
+        "image_url": upload_result.get('secure_url'),
+        "file_size": upload_result.get('bytes', file_size),
+        "image_width": image_info.get('width'),
+        "image_height": image_info.get('height'),
+        # From the raw name allowed_file() checked; sanitizing can drop the dot
+        "file_type": get_file_type(filename),
+        "content_hash": content_hash,
+        "ip_address": client_ip,
+        "user_agent": user_agent
+    }
+
+def content_hash(file_data):
+    return hashlib.sha256(file_data).hexdigest()
+
+# Columns a duplicate upload is answered from
+DUPLICATE_COLUMNS = (
+    Upload.filename, Upload.status, Upload.image_url, Upload.file_size,
+    Upload.image_width, Upload.image_height, Upload.content_hash
+)
+
+# A pending upload older than this was lost (worker killed mid-upload, failed
+# write) and will never finish
+PENDING_UPLOAD_TTL = timedelta(minutes=10)
+
+def find_duplicate_uploads(hashes, include_pending=True):
+    """Earliest live upload for each content hash, keyed by hash.
+
+    Rows still waiting in the batch queue aren't visible yet, so identical
+    uploads arriving together can still both go through. Pending rows only
+    count while they're younger than PENDING_UPLOAD_TTL, so a stuck row never
+    blocks the same bytes from being uploaded again.
+    """
+    live = Upload.status == 'ready'
+    if include_pending:
+        live = or_(live, and_(Upload.status == 'pending', Upload.uploaded_at >= datetime.utcnow() - PENDING_UPLOAD_TTL))
+    rows = db.session.query(*DUPLICATE_COLUMNS).filter(
+        Upload.content_hash.in_(hashes), live
+    ).order_by(Upload.id.desc()).all()
+    return {row.content_hash: row for row in rows}
+
+# --- BATCHED FINISHES ---
+# Pending rows are inserted before the request answers, so the status_url it
+# hands out resolves straight away. Each upload's final state (from the
+# background pool or Cloudinary's notification) is queued and written by a
+# background thread in batches, so a burst of completions shares one
+# transaction (and one fsync) instead of one each.
+FLUSH_BATCH_SIZE = 500
+FLUSH_INTERVAL = 0.05  # seconds to wait for more rows once one arrives
+FLUSH_RETRY_DELAY = 1  # first back-off while the database is unreachable
+FLUSH_RETRY_MAX_DELAY = 30
+pending_uploads = queue.Queue(maxsize=5000)
+FLUSH_STOP = object()  # queued at shutdown to make the flusher exit
+# executemany UPDATE; the SET clause comes from the non-public_id keys of each params dict
+FINISH_UPLOAD = Upload.__table__.update().where(Upload.__table__.c.filename == bindparam("public_id"))
+_flusher_lock = threading.Lock()
+_flusher_thread = None
+
+def drain_pending_uploads(max_items=FLUSH_BATCH_SIZE, timeout=FLUSH_INTERVAL):
+    """Block for the first queued row, then collect more until max_items, timeout or FLUSH_STOP"""
+    batch = [pending_uploads.get()]
+    deadline = time.monotonic() + timeout
+    while len(batch) < max_items and batch[-1] is not FLUSH_STOP:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(pending_uploads.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+def apply_finished_uploads(finished):
+    """Write a batch of finish_params() in one transaction"""
+    db.session.execute(FINISH_UPLOAD, finished)
+    db.session.commit()
+
+def is_transient_db_error(error):
+    """True for outages (restart, failover, exhausted pool) rather than bad data"""
+    if isinstance(error, (OperationalError, PoolTimeoutError)):
+        return True
+    return isinstance(error, DBAPIError) and error.connection_invalidated
+
+def apply_finished_uploads_until_written(finished):
+    """apply_finished_uploads(), backing off and retrying while the database is down.
+
+    These uploads were already answered 202, so an outage must delay them
+    rather than lose them; anything else (bad data) is raised.
+    """
+    delay = FLUSH_RETRY_DELAY
+    while True:
+        try:
+            apply_finished_uploads(finished)
+            return
+        except Exception as e:
+            db.session.rollback()
+            if not is_transient_db_error(e):
+                raise
+            app.logger.warning("Database unavailable, retrying %s queued uploads in %ss: %s", len(finished), delay, e)
+            time.sleep(delay)
+            delay = min(delay * 2, FLUSH_RETRY_MAX_DELAY)
+
+def write_upload_batch(finished):
+    """Apply a batch of queued finishes in a single transaction.
+
+    If the batch is rejected, its entries are retried one at a time so one bad
+    row doesn't drop every other client's upload with it.
+    """
+    with app.app_context():
+        try:
+            apply_finished_uploads_until_written(finished)
+        except Exception as e:
+            if len(finished) == 1:
+                app.logger.error("Failed to write queued upload: %s; entry: %s", e, finished[0], exc_info=True)
+            else:
+                app.logger.warning("Batch of %s queued uploads failed, retrying one by one: %s", len(finished), e)
+                for entry in finished:
+                    try:
+                        apply_finished_uploads_until_written([entry])
+                    except Exception as e:
+                        app.logger.error("Failed to write queued upload: %s; entry: %s", e, entry, exc_info=True)
+        invalidate_uploads_cache()
+
+PENDING_EXPIRY_INTERVAL = 60  # seconds between sweeps for abandoned pending rows
+EXPIRE_STALE_UPLOADS = Upload.__table__.update().where(
+    Upload.status == 'pending', Upload.uploaded_at < bindparam("cutoff")
+).values(status='failed')
+
+def expire_stale_uploads():
+    """Mark pending uploads older than PENDING_UPLOAD_TTL as failed.
+
+    Covers signed uploads the browser never sent and background uploads lost
+    with their worker; a late Cloudinary notification still finishes the row.
+    """
+    with app.app_context():
+        try:
+            result = db.session.execute(EXPIRE_STALE_UPLOADS, {"cutoff": datetime.utcnow() - PENDING_UPLOAD_TTL})
+            db.session.commit()
+            if result.rowcount:
+                app.logger.info("Expired %s abandoned pending uploads", result.rowcount)
+        except Exception as e:
+            db.session.rollback()
+            app.logger.warning("Failed to expire pending uploads: %s", e)
+
+def flush_pending_uploads():
+    last_expiry = 0
+    while True:
+        batch = drain_pending_uploads()
+        stopping = batch[-1] is FLUSH_STOP
+        entries = batch[:-1] if stopping else batch
+        if entries:
+            write_upload_batch(entries)
+        if stopping:
+            return
+        # Only runs while uploads are coming in, which is when pending rows appear
+        if time.monotonic() - last_expiry >= PENDING_EXPIRY_INTERVAL:
+            expire_stale_uploads()
+            last_expiry = time.monotonic()
+
+def ensure_flusher_running():
+    """Start the flusher lazily so every forked gunicorn worker gets its own thread"""
+    global _flusher_thread
+    with _flusher_lock:
+        if _flusher_thread is None or not _flusher_thread.is_alive():
+            _flusher_thread = threading.Thread(target=flush_pending_uploads, name="upload-flusher", daemon=True)
+            _flusher_thread.start()
+
+def insert_pending_uploads(rows):
+    """Write pending rows before answering, so their status_url never 404s"""
+    db.session.execute(insert(Upload), rows)
+    db.session.commit()
+
+def queue_finished_upload(params):
+    """Hand finish_params() to the flusher, or write them here if the queue is full"""
+    ensure_flusher_running()
     try:
-        uploads = Upload.query.order_by(Upload.uploaded_at.desc()).limit(100).all()
-        
-        html = """
-        <!DOCTYPE html><html lang="en"><head><meta charset="UTF-8"><meta name="viewport" content="width=device-width, initial-scale=1.0"><title>Monster's Gallery</title><script src="https://cdn.tailwindcss.com"></script><link href="https://fonts.googleapis.com/css2?family=Poppins:wght@400;500;700&display=swap" rel="stylesheet"><style>body{font-family:'Poppins',sans-serif;}.image-card{transition:all 0.3s ease;}.image-card:hover{transform:translateY(-5px);box-shadow:0 20px 40px rgba(0,0,0,0.1);}.loading{background:linear-gradient(90deg,#f0f0f0 25%,#e0e0e0 50%,#f0f0f0 75%);background-size:200% 100%;animation:loading 1.5s infinite;}@keyframes loading{0%{background-position:200% 0;}100%{background-position:-200% 0;}}.modal{display:none;position:fixed;z-index:1000;left:0;top:0;width:100%;height:100%;background-color:rgba(0,0,0,0.9);}.modal-content{position:absolute;top:50%;left:50%;transform:translate(-50%,-50%);max-width:90%;max-height:90%;}.modal img{max-width:100%;max-height:100%;object-fit:contain;}</style></head><body class="bg-gradient-to-br from-purple-400 to-pink-400 min-h-screen"><div class="container mx-auto px-4 py-8"><div class="text-center mb-8"><h1 class="text-5xl font-bold text-white mb-4">🍽️ Monster's Gallery</h1><p class="text-xl text-white/90 mb-4">All the delicious images our monster has devoured!</p><div class="inline-block bg-white/20 backdrop-blur-lg rounded-full px-6 py-2"><span class="text-white font-semibold">📊 Total Images: {total}</span></div></div>
-        """.format(total=len(uploads))
-        
-        if not uploads:
-            html += '''
+        pending_uploads.put_nowait(params)
+    except queue.Full:
+        write_upload_batch([params])
+
+@atexit.register
+def stop_flusher():
+    """Let the flusher write everything still queued before the worker exits"""
+    if _flusher_thread is not None and _flusher_thread.is_alive():
+        pending_uploads.put(FLUSH_STOP)
+        _flusher_thread.join(timeout=10)
+
+# --- BACKGROUND CLOUDINARY UPLOADS ---
+# /upload answers 202 once the image is validated; the CDN round-trip runs here
+# instead of holding the request worker. Every server-side Cloudinary upload
+# (background and bulk) goes through this pool, so its size is the per-worker
+# cap on concurrent Cloudinary requests; lower it to stay within the account's
+# concurrency limit across all gunicorn workers.
+CLOUDINARY_CONCURRENCY = int(os.environ.get("CLOUDINARY_CONCURRENCY", 8))
+upload_executor = ThreadPoolExecutor(max_workers=CLOUDINARY_CONCURRENCY, thread_name_prefix="cloudinary-upload")
+# Each queued upload holds its raw bytes (up to 16MB) until a thread is free,
+# so cap uploads in flight plus waiting per worker; past that, answer 503
+UPLOAD_BACKLOG_LIMIT = int(os.environ.get("UPLOAD_BACKLOG_LIMIT", 4 * CLOUDINARY_CONCURRENCY))
+upload_slots = threading.BoundedSemaphore(UPLOAD_BACKLOG_LIMIT)
+BUSY_ERROR = {"error": "Monster is too busy right now. Please try again shortly.", "code": "BUSY"}
+
+def reserve_upload_slot():
+    """Claim a backlog slot without waiting; False when the backlog is full"""
+    return upload_slots.acquire(blocking=False)
+
+def submit_upload(fn, *args):
+    """Run fn on the upload pool under a slot from reserve_upload_slot()"""
+    try:
+        future = upload_executor.submit(fn, *args)
+    except Exception:
+        upload_slots.release()
+        raise
+    future.add_done_callback(lambda _: upload_slots.release())
+    return future
+
+def finish_params(public_id, upload_result, file_size, image_info):
+    """UPDATE parameters for a finished upload; every batch needs the same keys"""
+    return {
+        "public_id": public_id,
+        "image_url": upload_result.get('secure_url'),
+        "file_size": upload_result.get('bytes', file_size),
+        "image_width": upload_result.get('width', image_info.get('width')),
+        "image_height": upload_result.get('height', image_info.get('height')),
+        "status": "ready" if upload_result.get('secure_url') else "failed",
+    }
+
+def finish_upload(public_id, file_data, image_info):
+    """Upload to Cloudinary and queue the row's final state"""
+    try:
+        upload_result = upload_to_cloudinary(file_data, public_id)
+        app.logger.info("Background upload of %s finished", public_id)
+    except Exception as e:
+        app.logger.error("Background upload of %s failed: %s", public_id, e, exc_info=True)
+        upload_result = {}
+    queue_finished_upload(finish_params(public_id, upload_result, len(file_data), image_info))
+
+GALLERY_PAGE_SIZE = 24
+# A plain integer counter bumped with INCR (the old "uploads:version" key held a pickled value)
+UPLOADS_VERSION_KEY = "uploads:generation"
+
+# Only the columns the gallery renders; matches the covering index
+GALLERY_COLUMNS = (
+    Upload.id, Upload.image_url, Upload.original_filename, Upload.file_size,
+    Upload.image_width, Upload.image_height, Upload.uploaded_at
+)
+
+# Static gallery chrome, built once; only the cards and counts vary per page
+GALLERY_HEAD = """<!DOCTYPE html><html lang="en"><head><meta charset="UTF-8"><meta name="viewport" content="width=device-width, initial-scale=1.0"><title>Monster's Gallery</title><script src="https://cdn.tailwindcss.com"></script><link href="https://fonts.googleapis.com/css2?family=Poppins:wght@400;500;700&display=swap" rel="stylesheet"><style>body{font-family:'Poppins',sans-serif;}.image-card{transition:all 0.3s ease;}.image-card:hover{transform:translateY(-5px);box-shadow:0 20px 40px rgba(0,0,0,0.1);}.loading{background:linear-gradient(90deg,#f0f0f0 25%,#e0e0e0 50%,#f0f0f0 75%);background-size:200% 100%;animation:loading 1.5s infinite;}@keyframes loading{0%{background-position:200% 0;}100%{background-position:-200% 0;}}.modal{display:none;position:fixed;z-index:1000;left:0;top:0;width:100%;height:100%;background-color:rgba(0,0,0,0.9);}.modal-content{position:absolute;top:50%;left:50%;transform:translate(-50%,-50%);max-width:90%;max-height:90%;}.modal img{max-width:100%;max-height:100%;object-fit:contain;}</style></head><body class="bg-gradient-to-br from-purple-400 to-pink-400 min-h-screen"><div class="container mx-auto px-4 py-8"><div class="text-center mb-8"><h1 class="text-5xl font-bold text-white mb-4">🍽️ Monster's Gallery</h1><p class="text-xl text-white/90 mb-4">All the delicious images our monster has devoured!</p><div class="inline-block bg-white/20 backdrop-blur-lg rounded-full px-6 py-2"><span class="text-white font-semibold">📊 Images on this page: """
+GALLERY_HEAD_END = """</span></div></div>
+        """
+
+GALLERY_EMPTY = '''
             <div class="text-center py-20">
                 <div class="text-8xl mb-4">😴</div>
                 <h2 class="text-3xl font-bold text-white mb-4">Monster is still hungry!</h2>
@@ -158,50 +767,17 @@ def view_uploads_gallery():
                 <a href="/" class="inline-block bg-yellow-500 hover:bg-yellow-600 text-black font-bold px-8 py-4 rounded-full transition-all duration-300 transform hover:scale-105">Feed the Monster!</a>
             </div>
             '''
-        else:
-            html += '<div class="grid grid-cols-1 sm:grid-cols-2 md:grid-cols-3 lg:grid-cols-4 xl:grid-cols-5 gap-6 mb-8">'
-            
-            for upload in uploads:
-                size_mb = (upload.file_size / (1024 * 1024)) if upload.file_size else 0
-                size_display = f"{size_mb:.1f} MB" if size_mb >= 1 else f"{(upload.file_size / 1024):.1f} KB" if upload.file_size else "Unknown"
-                
-                dimensions = ""
-                if upload.image_width and upload.image_height:
-                    dimensions = f"{upload.image_width}×{upload.image_height}"
-                
-                card_html = f'''
-                <div class="image-card bg-white/10 backdrop-blur-lg rounded-xl overflow-hidden shadow-lg">
-                    <div class="aspect-square bg-gray-200 loading relative overflow-hidden cursor-pointer" onclick="openModal('{upload.image_url}', '{upload.original_filename}')">
-                        <img src="{upload.image_url}" alt="{upload.original_filename}" 
-                             class="w-full h-full object-cover transition-opacity duration-300" 
-                             onload="this.parentElement.classList.remove('loading')"
-                             onerror="this.onerror=null;this.src='data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iMjAwIiBoZWlnaHQ9IjIwMCIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIj48cmVjdCB3aWR0aD0iMjAwIiBoZWlnaHQ9IjIwMCIgZmlsbD0iI2VlZSIvPjx0ZXh0IHg9IjEwMCIgeT0iMTAwIiBmb250LWZhbWlseT0ic2Fucy1zZXJpZiIgZm9udC1zaXplPSIxNCIgZmlsbD0iIzk5OSIgdGV4dC1hbmNob3I9Im1pZGRsZSIgZHk9Ii4zZW0iPkltYWdlIE5vdCBGb3VuZDwvdGV4dD48L3N2Zz4=';this.parentElement.classList.remove('loading')">
-                    </div>
-                    <div class="p-4">
-                        <p class="font-semibold text-white truncate text-sm" title="{upload.original_filename}">{upload.original_filename}</p>
-                        <div class="text-xs text-white/70 mt-2 space-y-1">
-                            <p>📅 {upload.uploaded_at.strftime('%b %d, %Y')}</p>
-                            <p>📏 {dimensions}</p>
-                            <p>💾 {size_display}</p>
-                        </div>
-                    </div>
-                </div>
-                '''
-                html += card_html
-                
-            html += '</div>'
-            
-            # Back to home button
-            html += '''
+
+GALLERY_HOME_LINK = '''
             <div class="text-center">
                 <a href="/" class="inline-block bg-gradient-to-r from-purple-500 to-pink-500 hover:from-purple-600 hover:to-pink-600 text-white font-bold px-8 py-4 rounded-full transition-all duration-300 transform hover:scale-105 shadow-lg">
                     🍽️ Feed Monster More!
                 </a>
             </div>
             '''
-        
-        # Modal for full-size images
-        html += '''
+
+# Modal for full-size images
+GALLERY_TAIL = '''
         <div id="imageModal" class="modal" onclick="closeModal()">
             <div class="modal-content">
                 <img id="modalImage" src="" alt="">
@@ -226,262 +802,710 @@ def view_uploads_gallery():
         
         </div></body></html>
         '''
+
+# Gallery cards show square crops; the modal still opens the stored image
+GALLERY_THUMB_WIDTHS = (400, 800)
+GALLERY_THUMB_SIZES = "(min-width: 640px) 320px, 100vw"
+CLOUDINARY_UPLOAD_PATH = "/image/upload/"
+
+def thumbnail_url(image_url, width):
+    """Cloudinary delivery URL for a square, auto-format thumbnail of an upload.
+
+    Cloudinary derives and caches the variant on first request, so nothing has
+    to be generated at upload time.
+    """
+    return image_url.replace(CLOUDINARY_UPLOAD_PATH, f"{CLOUDINARY_UPLOAD_PATH}c_fill,w_{width},h_{width}/f_auto,q_auto/", 1)
+
+GALLERY_DATE_FORMAT = "%b %d, %Y"
+# "Image Not Found" placeholder swapped in when a Cloudinary URL fails to load
+GALLERY_IMAGE_FALLBACK = "data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iMjAwIiBoZWlnaHQ9IjIwMCIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIj48cmVjdCB3aWR0aD0iMjAwIiBoZWlnaHQ9IjIwMCIgZmlsbD0iI2VlZSIvPjx0ZXh0IHg9IjEwMCIgeT0iMTAwIiBmb250LWZhbWlseT0ic2Fucy1zZXJpZiIgZm9udC1zaXplPSIxNCIgZmlsbD0iIzk5OSIgdGV4dC1hbmNob3I9Im1pZGRsZSIgZHk9Ii4zZW0iPkltYWdlIE5vdCBGb3VuZDwvdGV4dD48L3N2Zz4="
+
+def render_gallery_card(upload):
+    """HTML for one gallery card"""
+    size_mb = (upload.file_size / (1024 * 1024)) if upload.file_size else 0
+    size_display = f"{size_mb:.1f} MB" if size_mb >= 1 else f"{(upload.file_size / 1024):.1f} KB" if upload.file_size else "Unknown"
+
+    dimensions = ""
+    if upload.image_width and upload.image_height:
+        dimensions = f"{upload.image_width}×{upload.image_height}"
+
+    # Filenames and URLs are escaped; the modal reads them back from data attributes
+    name = escape(upload.original_filename)
+    image_url = escape(upload.image_url)
+    thumbnails = escape(', '.join(f"{thumbnail_url(upload.image_url, width)} {width}w" for width in GALLERY_THUMB_WIDTHS))
+
+    return f'''
+    <div class="image-card bg-white/10 backdrop-blur-lg rounded-xl overflow-hidden shadow-lg">
+        <div class="aspect-square bg-gray-200 loading relative overflow-hidden cursor-pointer" data-src="{image_url}" data-alt="{name}" onclick="openModal(this.dataset.src, this.dataset.alt)">
+            <img src="{escape(thumbnail_url(upload.image_url, GALLERY_THUMB_WIDTHS[0]))}" srcset="{thumbnails}" sizes="{GALLERY_THUMB_SIZES}"
+                 alt="{name}" loading="lazy" decoding="async"
+                 class="w-full h-full object-cover transition-opacity duration-300" 
+                 onload="this.parentElement.classList.remove('loading')"
+                 onerror="this.onerror=null;this.removeAttribute('srcset');this.src='{GALLERY_IMAGE_FALLBACK}';this.parentElement.classList.remove('loading')">
+        </div>
+        <div class="p-4">
+            <p class="font-semibold text-white truncate text-sm" title="{name}">{name}</p>
+            <div class="text-xs text-white/70 mt-2 space-y-1">
+                <p>📅 {upload.uploaded_at.strftime(GALLERY_DATE_FORMAT)}</p>
+                <p>📏 {dimensions}</p>
+                <p>💾 {size_display}</p>
+            </div>
+        </div>
+    </div>
+    '''
+
+def uploads_cache_version():
+    """Current generation of cached upload listings"""
+    return cache.get(UPLOADS_VERSION_KEY) or 0
+
+def invalidate_uploads_cache():
+    """Bump the generation so every cached listing key goes stale at once.
+
+    The backend's inc() is an atomic INCR on Redis, so concurrent bumps from
+    several workers can't read the same version and both write it back plus one.
+    """
+    cache.cache.inc(UPLOADS_VERSION_KEY)
+
+def encode_cursor(uploaded_at, upload_id):
+    """Encode a gallery position as an opaque URL-safe cursor"""
+    raw = f"{uploaded_at.isoformat()}|{upload_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    """Decode a gallery cursor into (uploaded_at, id), or None if malformed"""
+    try:
+        timestamp, _, upload_id = base64.urlsafe_b64decode(cursor.encode()).decode().partition('|')
+        return datetime.fromisoformat(timestamp), int(upload_id)
+    except (ValueError, binascii.Error):
+        return None
+
+# --- PRECOMPUTED RESPONSES ---
+# These never change at runtime, so encode them once at import
+
+def _api_info_bytes(monster_status):
+    return orjson.dumps({
+        "message": "Monster Feed API v2.2.0",
+        "endpoints": {
+            "upload": "/upload (POST) - Feed the monster with images",
+            "bulk_upload": "/upload/bulk (POST) - Feed the monster several images at once",
+            "upload_status": "/upload/<id> (GET) - Check on an image the monster is still chewing",
+            "upload_sign": "/upload/sign (POST) - Get signed parameters to upload straight to Cloudinary",
+            "gallery": "/gallery (GET) - View monster's feast",
+            "health": "/health (GET) - Check system health",
+            "stats": "/stats (GET) - View upload statistics"
+        },
+        "limits": {
+            "max_file_size": "16MB",
+            "supported_formats": SUPPORTED_FORMATS,
+            "rate_limit": "10 uploads per minute, 50 per hour, 200 per day"
+        },
+        "version": "2.2.0",
+        "monster_status": monster_status
+    })
+
+API_INFO_BYTES = {status: _api_info_bytes(status) for status in ("hungry", "satisfied")}
+# Hash of the body, so a deploy that changes the payload also changes the tag
+API_INFO_ETAGS = {status: hashlib.sha1(body).hexdigest() for status, body in API_INFO_BYTES.items()}
+
+NOT_FOUND_BYTES = orjson.dumps({
+    "error": "Page not found", 
+    "code": "NOT_FOUND",
+    "available_endpoints": ["/", "/upload", "/upload/bulk", "/gallery", "/health", "/stats", "/api"]
+})
+
+FILE_TOO_LARGE_BYTES = orjson.dumps({
+    "error": "File too large. Maximum size is 16MB",
+    "code": "FILE_TOO_LARGE"
+})
+
+RATE_LIMIT_EXCEEDED_BYTES = orjson.dumps({
+    "error": "Too many uploads. Please wait before trying again.",
+    "code": "RATE_LIMIT_EXCEEDED",
+    "retry_after": "60 seconds"
+})
+
+INTERNAL_ERROR_BYTES = orjson.dumps({
+    "error": "Internal server error. Please try again later.",
+    "code": "INTERNAL_ERROR"
+})
+
+def conditional_response(body, mimetype, etag, mtime, max_age, immutable=False):
+    """Response that answers If-None-Match, If-Modified-Since and Range requests itself"""
+    response = Response(body, mimetype=mimetype)
+    response.set_etag(etag)
+    response.last_modified = datetime.fromtimestamp(mtime, timezone.utc)
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    response.cache_control.immutable = immutable
+    return response.make_conditional(request, accept_ranges=True, complete_length=len(body))
+
+def revalidated_response(body, etag, mimetype):
+    """Response clients must revalidate; a matching If-None-Match gets a 304"""
+    response = Response(body, mimetype=mimetype)
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def load_static_png(filename):
+    """Read a static image once, returning (body, etag, mtime)"""
+    path = os.path.join(app.root_path, filename)
+    with open(path, 'rb') as f:
+        body = f.read()
+    return body, hashlib.sha1(body).hexdigest(), os.stat(path).st_mtime
+
+STATIC_PNGS = {}
+STATIC_IMMUTABLE_MAX_AGE = 30 * 24 * 3600  # for versioned URLs; browsers and CDNs never revalidate
+for _png in ('hungry.png', 'yumm.png'):
+    try:
+        STATIC_PNGS[_png] = load_static_png(_png)
+    except OSError as e:
+        app.logger.warning("Static image %s not available: %s", _png, e)
+
+def static_png_version(filename):
+    return STATIC_PNGS[filename][1][:12]
+
+def serve_static_png(filename):
+    """Serve a preloaded static image without touching the filesystem.
+
+    index.html links to ?v=<content hash> URLs, which are cached for good so a
+    CDN in front of the app only ever asks once per deploy.
+    """
+    if filename not in STATIC_PNGS:
+        return Response(NOT_FOUND_BYTES, status=404, mimetype="application/json")
+    
+    versioned = request.args.get('v') == static_png_version(filename)
+    if X_ACCEL_REDIRECT_PREFIX:
+        # The proxy streams the file and answers conditional requests itself
+        return Response(mimetype="image/png", headers={
+            "X-Accel-Redirect": f"{X_ACCEL_REDIRECT_PREFIX.rstrip('/')}/{filename}",
+            "Cache-Control": f"public, max-age={STATIC_IMMUTABLE_MAX_AGE}, immutable" if versioned else "public, max-age=86400"
+        })
+    
+    body, etag, mtime = STATIC_PNGS[filename]
+    if versioned:
+        return conditional_response(body, "image/png", etag, mtime, max_age=STATIC_IMMUTABLE_MAX_AGE, immutable=True)
+    return conditional_response(body, "image/png", etag, mtime, max_age=86400)
+
+INDEX_PATH = os.path.join(app.root_path, 'index.html')
+# The page is fixed for the life of a deploy; only pick up edits while developing
+INDEX_AUTO_RELOAD = os.environ.get('FLASK_ENV') == 'development'
+
+def read_index_html():
+    """Read index.html, returning (body, etag, mtime)"""
+    mtime = os.stat(INDEX_PATH).st_mtime
+    with open(INDEX_PATH, 'rb') as f:
+        body = f.read()
+    # Point the monster images at their immutable, versioned URLs
+    for filename in STATIC_PNGS:
+        body = body.replace(f'src="{filename}"'.encode(), f'src="{filename}?v={static_png_version(filename)}"'.encode())
+    return body, hashlib.sha1(body).hexdigest(), mtime
+
+try:
+    _index_page = read_index_html()
+except OSError as e:
+    _index_page = None
+    app.logger.warning("index.html not available: %s", e)
+
+def load_index_html():
+    """index.html as loaded at startup, or None when it's missing"""
+    global _index_page
+    if INDEX_AUTO_RELOAD:
+        try:
+            if _index_page is None or os.stat(INDEX_PATH).st_mtime != _index_page[2]:
+                _index_page = read_index_html()
+        except OSError:
+            _index_page = None
+    return _index_page
+
+# --- ROUTES ---
+
+@app.route('/')
+def index():
+    if app.use_x_sendfile:
+        return send_from_directory(app.root_path, 'index.html', max_age=60)
+    
+    page = load_index_html()
+    if page is None:
+        return ojsonify({"error": "Frontend not found."}, 404)
+    
+    body, etag, mtime = page
+    return conditional_response(body, "text/html", etag, mtime, max_age=60)
+
+@app.route('/gallery')
+def view_uploads_gallery():
+    try:
+        # Keyset pagination: seek past the cursor instead of OFFSET + COUNT.
+        # Plain Row tuples skip ORM object hydration for this read-only page.
+        query = db.session.query(*GALLERY_COLUMNS).filter(Upload.status == 'ready')
+        cursor = request.args.get('cursor')
+        if cursor:
+            position = decode_cursor(cursor)
+            if position is None:
+                return ojsonify({"error": "Invalid gallery cursor", "code": "INVALID_CURSOR"}, 400)
+            query = query.filter(tuple_(Upload.uploaded_at, Upload.id) < position)
+        
+        cache_key = f"gallery:v{uploads_cache_version()}:{cursor or ''}"
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return revalidated_response(*cached, "text/html")
+        
+        uploads = query.order_by(Upload.uploaded_at.desc(), Upload.id.desc()).limit(GALLERY_PAGE_SIZE + 1).all()
+        next_cursor = None
+        if len(uploads) > GALLERY_PAGE_SIZE:
+            uploads = uploads[:GALLERY_PAGE_SIZE]
+            next_cursor = encode_cursor(uploads[-1].uploaded_at, uploads[-1].id)
+        
+        # Pieces are collected and joined once instead of growing one string per card
+        parts = [GALLERY_HEAD, str(len(uploads)), GALLERY_HEAD_END]
         
-        return html
+        if not uploads:
+            parts.append(GALLERY_EMPTY)
+        else:
+            parts.append('<div class="grid grid-cols-1 sm:grid-cols-2 md:grid-cols-3 lg:grid-cols-4 xl:grid-cols-5 gap-6 mb-8">')
+            
+            parts.append(''.join(map(render_gallery_card, uploads)))
+            parts.append('</div>')
+            
+            if next_cursor:
+                parts.append(f'''
+            <div class="text-center mb-8">
+                <a href="/gallery?cursor={next_cursor}" class="inline-block bg-white/20 hover:bg-white/30 text-white font-bold px-8 py-4 rounded-full transition-all duration-300 transform hover:scale-105">
+                    ⬇️ Older Treats
+                </a>
+            </div>
+            ''')
+            
+            parts.append(GALLERY_HOME_LINK)
+        
+        parts.append(GALLERY_TAIL)
+        
+        body = ''.join(parts).encode()
+        etag = hashlib.sha1(body).hexdigest()
+        cache.set(cache_key, (body, etag))
+        return revalidated_response(body, etag, "text/html")
     except Exception as e:
-        app.logger.error(f"Gallery error: {e}")
-        return jsonify({"error": "Failed to load gallery"}), 500
+        app.logger.error("Gallery error: %s", e)
+        return ojsonify({"error": "Failed to load gallery"}, 500)
 
 # Static image routes
 @app.route('/hungry.png')
 def hungry_image():
-    return send_from_directory('.', 'hungry.png')
+    return serve_static_png('hungry.png')
 
 @app.route('/yumm.png')
 def yummy_image():
-    return send_from_directory('.', 'yumm.png')
+    return serve_static_png('yumm.png')
 
 @app.route('/upload', methods=['POST'])
 @limiter.limit("10 per minute")
 def upload_file_route():
     start_time = time.time()
     
-    # Enhanced validation
-    if 'file' not in request.files:
-        return jsonify({"error": "No file provided", "code": "NO_FILE"}), 400
-        
-    file = request.files['file']
-    
-    if file.filename == '':
-        return jsonify({"error": "No file selected", "code": "EMPTY_FILENAME"}), 400
-    
-    if not allowed_file(file.filename):
-        supported_types = ", ".join(['png', 'jpg', 'jpeg', 'gif', 'bmp', 'webp', 'tiff', 'svg'])
-        return jsonify({
-            "error": f"File type not supported. Supported types: {supported_types}", 
-            "code": "UNSUPPORTED_TYPE"
-        }), 400
-
-    # Read file data
+    # Claim the backlog slot before request.files parses the body, so a full
+    # worker turns uploads away without reading them into memory first
+    if not reserve_upload_slot():
+        return ojsonify(BUSY_ERROR, 503)
+    submitted = False
     try:
-        file.seek(0)  # Reset file pointer
-        file_data = file.read()
-        file_size = len(file_data)
-        
-        # Check file size (16MB limit)
-        if file_size > 16 * 1024 * 1024:
-            return jsonify({
-                "error": "File too large. Maximum size is 16MB", 
-                "code": "FILE_TOO_LARGE"
-            }), 400
-            
-        if file_size < 100:  # Minimum 100 bytes
-            return jsonify({
-                "error": "File too small. Minimum size is 100 bytes", 
-                "code": "FILE_TOO_SMALL"
-            }), 400
-            
-    except Exception as e:
-        app.logger.error(f"File reading error: {e}")
-        return jsonify({
-            "error": "Failed to read file", 
-            "code": "READ_ERROR"
-        }), 400
+        file = request.files.get('file')
+        file_data, image_info, error = read_upload_file(file)
+        if error:
+            return ojsonify(error, upload_error_status(error))
 
-    # Validate image
-    image_info, validation_error = validate_image_file(file_data)
-    if validation_error:
-        return jsonify({
-            "error": validation_error, 
-            "code": "INVALID_IMAGE"
-        }), 400
-
-    try:
-        app.logger.info(f"Processing upload: {file.filename} ({file_size} bytes)")
-        
-        # Optimize image if it's large
-        if file_size > 1024 * 1024:  # 1MB threshold
-            app.logger.info("Optimizing large image...")
-            file_data = optimize_image(file_data)
-            
-        # Upload to Cloudinary with transformation
-        upload_result = cloudinary.uploader.upload(
-            file_data,
-            transformation=[
-                {"quality": "auto:good"},
-                {"fetch_format": "auto"}
-            ],
-            resource_type="auto"
-        )
-        
-        app.logger.info("File uploaded to Cloudinary successfully.")
-
-        # Extract metadata
-        secure_url = upload_result['secure_url']
-        cloudinary_file_size = upload_result.get('bytes', file_size)
-        original_filename = secure_filename(file.filename)
-        public_id = upload_result['public_id']
+        app.logger.info("Processing upload: %s (%s bytes)", file.filename, len(file_data))
         
-        # Get client information
-        client_ip = request.headers.get('X-Forwarded-For', request.remote_addr).split(',')[0].strip()
-        user_agent = request.headers.get('User-Agent', '')[:500]  # Limit length
+        # The same bytes were already uploaded: answer with that upload, no Cloudinary call
+        file_hash = content_hash(file_data)
+        duplicate = find_duplicate_uploads([file_hash]).get(file_hash)
+        if duplicate is not None:
+            processing_time = round((time.time() - start_time) * 1000, 2)  # in milliseconds
+            return ojsonify({
+                "message": "Monster already ate this one!",
+                "id": duplicate.filename,
+                "status": duplicate.status,
+                "status_url": url_for('upload_status', public_id=duplicate.filename),
+                "url": duplicate.image_url,
+                "file_size": duplicate.file_size,
+                "dimensions": f"{duplicate.image_width}x{duplicate.image_height}" if duplicate.image_width else None,
+                "processing_time": f"{processing_time}ms",
+                "code": "DUPLICATE"
+            }, 200 if duplicate.status == 'ready' else 202)
         
-        # Create database record
-        new_upload = Upload(
-            filename=public_id,
-            original_filename=original_filename,
-            image_url=secure_url,
-            file_size=cloudinary_file_size,
-            image_width=image_info.get('width'),
-            image_height=image_info.get('height'),
-            ip_address=client_ip,
-            user_agent=user_agent
-        )
-        
-        db.session.add(new_upload)
-        db.session.commit()
+        # Record the upload as pending, then upload in the background
+        public_id = uuid.uuid4().hex
+        row = build_upload_row(file.filename, len(file_data), image_info, {"public_id": public_id}, file_hash)
+        row['status'] = 'pending'
+        insert_pending_uploads([row])
+        submitted = True  # from here the slot belongs to submit_upload
+        submit_upload(finish_upload, public_id, file_data, image_info)
         
         processing_time = round((time.time() - start_time) * 1000, 2)  # in milliseconds
-        app.logger.info(f"Upload completed in {processing_time}ms for {original_filename}")
+        app.logger.info("Upload accepted in %sms for %s", processing_time, row['original_filename'])
 
-        return jsonify({
-            "message": "Monster enjoyed your image! Upload successful!",
-            "url": secure_url,
-            "file_size": cloudinary_file_size,
+        return ojsonify({
+            "message": "Monster is chewing on your image!",
+            "id": public_id,
+            "status": "pending",
+            "status_url": url_for('upload_status', public_id=public_id),
+            "file_size": row['file_size'],
             "dimensions": f"{image_info.get('width')}x{image_info.get('height')}",
             "processing_time": f"{processing_time}ms",
-            "code": "SUCCESS"
-        }), 200
-
-    except cloudinary.exceptions.Error as e:
-        app.logger.error(f"Cloudinary error: {e}")
-        db.session.rollback()
-        return jsonify({
-            "error": "Image processing failed. Please try a different image.",
-            "code": "CLOUDINARY_ERROR"
-        }), 500
+            "code": "ACCEPTED"
+        }, 202)
         
+    except HTTPException:
+        raise  # e.g. 413 from parsing an oversized body
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error("Upload error: %s", e, exc_info=True)
+        return ojsonify({
+            "error": "An unexpected error occurred during upload.",
+            "code": "INTERNAL_ERROR"
+        }, 500)
+    finally:
+        if not submitted:
+            upload_slots.release()
+
+@app.route('/upload/<public_id>')
+@limiter.exempt
+def upload_status(public_id):
+    """Poll target for a background upload"""
+    upload = db.session.query(
+        Upload.status, Upload.image_url, Upload.file_size, Upload.image_width, Upload.image_height
+    ).filter(Upload.filename == public_id).first()
+    if upload is None:
+        return ojsonify({"error": "Upload not found", "code": "UPLOAD_NOT_FOUND"}, 404)
+    return ojsonify({
+        "id": public_id,
+        "status": upload.status,
+        "url": upload.image_url,
+        "file_size": upload.file_size,
+        "dimensions": f"{upload.image_width}x{upload.image_height}" if upload.image_width and upload.image_height else None,
+        "code": upload.status.upper()
+    })
+
+# --- DIRECT UPLOADS ---
+# Browsers POST the file straight to Cloudinary with parameters signed here;
+# Cloudinary then calls /upload/notify, which finishes the pending row.
+DIRECT_UPLOAD_FORMATS = ",".join(SUPPORTED_FORMATS)
+DIRECT_UPLOAD_BATCH_LIMIT = 20  # files signed per request
+
+def sign_direct_upload(entry, api_secret):
+    """Signed Cloudinary parameters and a pending row for one file, or an error dict"""
+    filename = str(entry.get('filename') or '') if isinstance(entry, dict) else ''
+    if not filename:
+        return {"error": "No file selected", "code": "EMPTY_FILENAME"}, None
+    if not allowed_file(filename):
+        return {"filename": filename, "error": UNSUPPORTED_TYPE_MESSAGE, "code": "UNSUPPORTED_TYPE"}, None
+    try:
+        file_size = int(entry.get('size') or 0)
+    except (TypeError, ValueError):
+        file_size = 0
+    if file_size > app.config['MAX_CONTENT_LENGTH']:
+        return {"filename": filename, "error": "File too large. Maximum size is 16MB", "code": "FILE_TOO_LARGE"}, None
+    
+    public_id = uuid.uuid4().hex
+    params = {
+        "public_id": public_id,
+        "timestamp": int(time.time()),
+        "transformation": cloudinary.utils.generate_transformation_string(transformation=UPLOAD_TRANSFORMATION)[0],
+        "allowed_formats": DIRECT_UPLOAD_FORMATS,
+        "notification_url": url_for('upload_notify', _external=True),
+    }
+    params["signature"] = cloudinary.utils.api_sign_request(params, api_secret)
+    
+    # Pending until Cloudinary reports back; same path as /upload from here on
+    row = build_upload_row(filename, file_size or None, {}, {"public_id": public_id})
+    row['status'] = 'pending'
+    return {
+        "filename": filename,
+        "id": public_id,
+        "params": params,
+        "status_url": url_for('upload_status', public_id=public_id)
+    }, row
+
+@app.route('/upload/sign', methods=['POST'])
+@limiter.limit("10 per minute")
+def sign_upload_route():
+    """Sign a whole selection in one request: {"files": [{"filename", "size"}, ...]}"""
+    payload = request.get_json(silent=True)
+    files = payload.get('files') if isinstance(payload, dict) else None
+    if not isinstance(files, list) or not files:
+        return ojsonify({"error": "No files provided", "code": "NO_FILE"}, 400)
+    if len(files) > DIRECT_UPLOAD_BATCH_LIMIT:
+        return ojsonify({
+            "error": f"Too many files. Maximum is {DIRECT_UPLOAD_BATCH_LIMIT} per request",
+            "code": "TOO_MANY_FILES"
+        }, 400)
+    
+    config = cloudinary.config()
+    if not (config.cloud_name and config.api_key and config.api_secret):
+        return ojsonify({"error": "Direct uploads are not available.", "code": "CLOUDINARY_ERROR"}, 503)
+    
+    uploads = []
+    rows = []
+    for entry in files:
+        signed, row = sign_direct_upload(entry, config.api_secret)
+        uploads.append(signed)
+        if row is not None:
+            rows.append(row)
+    
+    if rows:
+        try:
+            insert_pending_uploads(rows)
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error("Failed to record signed uploads: %s", e, exc_info=True)
+            return ojsonify({
+                "error": "An unexpected error occurred while signing uploads.",
+                "code": "INTERNAL_ERROR"
+            }, 500)
+    
+    # Entries without "params" failed validation and carry an error instead
+    return ojsonify({
+        "upload_url": f"https://api.cloudinary.com/v1_1/{config.cloud_name}/image/upload",
+        "api_key": config.api_key,
+        "uploads": uploads,
+        "code": "SIGNED" if len(rows) == len(uploads) else "PARTIAL_SUCCESS"
+    })
+
+@app.route('/upload/notify', methods=['POST'])
+@limiter.exempt
+def upload_notify():
+    """Cloudinary upload notification for a direct upload"""
+    if not cloudinary.config().api_secret:
+        return ojsonify({"error": "Direct uploads are not available.", "code": "CLOUDINARY_ERROR"}, 503)
+    
+    body = request.get_data(as_text=True)
+    timestamp = request.headers.get('X-Cld-Timestamp', '')
+    signature = request.headers.get('X-Cld-Signature', '')
+    if not timestamp.isdigit() or not cloudinary.utils.verify_notification_signature(body, int(timestamp), signature):
+        return ojsonify({"error": "Invalid notification signature", "code": "INVALID_SIGNATURE"}, 401)
+    
+    try:
+        notification = orjson.loads(body)
+    except orjson.JSONDecodeError:
+        return ojsonify({"error": "Malformed notification", "code": "INVALID_NOTIFICATION"}, 400)
+    if notification.get('notification_type') != 'upload' or not notification.get('public_id'):
+        return ojsonify({"code": "IGNORED"})
+    
+    # The pending row was written at signing time, long before this arrives
+    queue_finished_upload(finish_params(notification['public_id'], notification, None, {}))
+    return ojsonify({"code": "OK"})
+
+@app.route('/upload/bulk', methods=['POST'])
+@limiter.limit("5 per minute")
+def bulk_upload_route():
+    start_time = time.time()
+    
+    files = request.files.getlist('files')
+    if not files:
+        return ojsonify({"error": "No files provided", "code": "NO_FILE"}, 400)
+
+    failed = []
+    valid = []
+    for file in files:
+        file_data, image_info, error = read_upload_file(file)
+        if error:
+            failed.append({"filename": file.filename, **error})
+            continue
+        valid.append((file, file_data, image_info, content_hash(file_data)))
+
+    # Files already uploaded (and finished) are answered with their stored URL
+    duplicates = find_duplicate_uploads([entry[3] for entry in valid], include_pending=False)
+    uploaded = []
+    accepted = []
+    for file, file_data, image_info, file_hash in valid:
+        if file_hash in duplicates:
+            uploaded.append({"filename": secure_filename(file.filename), "url": duplicates[file_hash].image_url})
+            continue
+        if not reserve_upload_slot():
+            failed.append({"filename": file.filename, **BUSY_ERROR})
+            continue
+        # Start every Cloudinary upload up front so they run concurrently on the
+        # shared upload pool (pooled HTTPS connections) instead of one after another
+        accepted.append((file, file_data, image_info, file_hash, submit_upload(upload_to_cloudinary, file_data)))
+
+    rows = []
+    for file, file_data, image_info, file_hash, future in accepted:
+        try:
+            rows.append(build_upload_row(file.filename, len(file_data), image_info, future.result(), file_hash))
+        except cloudinary.exceptions.Error as e:
+            app.logger.error("Cloudinary error for %s: %s", file.filename, e)
+            failed.append({
+                "filename": file.filename,
+                "error": "Image processing failed. Please try a different image.",
+                "code": "CLOUDINARY_ERROR"
+            })
+
+    if not rows and not uploaded:
+        return ojsonify({
+            "error": "None of the files could be uploaded.",
+            "code": "ALL_FAILED",
+            "failed": failed
+        }, 400)
+
+    try:
+        # One executemany INSERT for the whole request instead of a commit per file
+        if rows:
+            db.session.execute(insert(Upload), rows)
+            db.session.commit()
+            invalidate_uploads_cache()
     except Exception as e:
-        app.logger.error(f"Upload error: {e}", exc_info=True)
+        app.logger.error("Bulk upload error: %s", e, exc_info=True)
         db.session.rollback()
-        return jsonify({
+        return ojsonify({
             "error": "An unexpected error occurred during upload.",
             "code": "INTERNAL_ERROR"
-        }), 500
+        }, 500)
+
+    processing_time = round((time.time() - start_time) * 1000, 2)  # in milliseconds
+    app.logger.info("Bulk upload of %s files completed in %sms", len(rows), processing_time)
+    uploaded.extend({"filename": row['original_filename'], "url": row['image_url']} for row in rows)
+
+    return ojsonify({
+        "message": f"Monster devoured {len(uploaded)} images!",
+        "uploaded": uploaded,
+        "failed": failed,
+        "processing_time": f"{processing_time}ms",
+        "code": "SUCCESS" if not failed else "PARTIAL_SUCCESS"
+    }, 200)
 
 @app.route('/api')
 def api_info():
-    return jsonify({
-        "message": "Monster Feed API v2.2.0",
-        "endpoints": {
-            "upload": "/upload (POST) - Feed the monster with images",
-            "gallery": "/gallery (GET) - View monster's feast",
-            "health": "/health (GET) - Check system health",
-            "stats": "/stats (GET) - View upload statistics"
-        },
-        "limits": {
-            "max_file_size": "16MB",
-            "supported_formats": ["png", "jpg", "jpeg", "gif", "bmp", "webp", "tiff", "svg"],
-            "rate_limit": "10 uploads per minute, 50 per hour, 200 per day"
-        },
-        "version": "2.2.0",
-        "monster_status": "hungry" if Upload.query.count() == 0 else "satisfied"
-    })
+    cache_key = f"api:v{uploads_cache_version()}"
+    monster_status = cache.get(cache_key)
+    if monster_status is None:
+        has_uploads = db.session.query(db.select(Upload.id).where(Upload.status == 'ready').exists()).scalar()
+        monster_status = "satisfied" if has_uploads else "hungry"
+        cache.set(cache_key, monster_status)
+    return revalidated_response(API_INFO_BYTES[monster_status], API_INFO_ETAGS[monster_status], "application/json")
 
 @app.route('/stats')
 def stats():
+    cache_key = f"stats:v{uploads_cache_version()}"
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return revalidated_response(*cached, "application/json")
     try:
-        total_uploads = Upload.query.count()
-        total_size = db.session.query(db.func.sum(Upload.file_size)).scalar() or 0
-        recent_uploads = Upload.query.filter(Upload.uploaded_at >= datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)).count()
+        # Totals in one aggregate pass instead of three separate scans; only
+        # finished uploads count, not pending or failed ones
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        total_uploads, total_size, recent_uploads = db.session.query(
+            db.func.count(),
+            db.func.coalesce(db.func.sum(Upload.file_size), 0),
+            db.func.count().filter(Upload.uploaded_at >= today)
+        ).filter(Upload.status == 'ready').one()
         
-        # File type statistics
-        file_types = db.session.query(
-            db.func.substring(Upload.original_filename, db.func.length(Upload.original_filename) - db.func.position('.' in db.func.reverse(Upload.original_filename)) + 2),
-            db.func.count()
-        ).group_by(
-            db.func.substring(Upload.original_filename, db.func.length(Upload.original_filename) - db.func.position('.' in db.func.reverse(Upload.original_filename)) + 2)
-        ).all()
+        # File type statistics, grouped on the indexed column stored at insert
+        file_types = db.session.query(Upload.file_type, db.func.count()).filter(Upload.status == 'ready').group_by(Upload.file_type).all()
         
-        return jsonify({
+        body = orjson.dumps({
             "total_uploads": total_uploads,
             "total_size_mb": round(total_size / (1024 * 1024), 2),
             "uploads_today": recent_uploads,
-            "file_types": dict(file_types) if file_types else {},
+            "file_types": {file_type or 'unknown': count for file_type, count in file_types},
             "monster_satisfaction": "very happy" if total_uploads > 100 else "happy" if total_uploads > 10 else "getting satisfied" if total_uploads > 0 else "hungry"
         })
+        etag = hashlib.sha1(body).hexdigest()
+        cache.set(cache_key, (body, etag))
+        return revalidated_response(body, etag, "application/json")
     except Exception as e:
-        app.logger.error(f"Stats error: {e}")
-        return jsonify({"error": "Failed to load statistics"}), 500
+        app.logger.error("Stats error: %s", e)
+        return ojsonify({"error": "Failed to load statistics"}, 500)
+
+HEALTH_CACHE_TTL = 5  # seconds
+_health_cache = (0, None)  # (checked_at, payload) of the last healthy probe
+CLOUDINARY_PROBE_TTL = 30  # seconds; each ping is a cross-region HTTPS call against the API quota
+_cloudinary_probe = (0, False)  # (checked_at, ok) of the last ping, healthy or not
+
+def cloudinary_reachable():
+    """Cloudinary ping result, reused for CLOUDINARY_PROBE_TTL seconds"""
+    global _cloudinary_probe
+    checked_at, ok = _cloudinary_probe
+    if time.time() - checked_at < CLOUDINARY_PROBE_TTL:
+        return ok
+    try:
+        cloudinary.api.ping()
+        ok = True
+    except Exception as e:
+        app.logger.warning("Cloudinary health check failed: %s", e)
+        ok = False
+    _cloudinary_probe = (time.time(), ok)
+    return ok
+
+def estimated_upload_count(conn):
+    """Approximate upload count; on Postgres read planner stats instead of COUNT(*)"""
+    if conn.dialect.name == 'postgresql':
+        estimate = conn.execute(text("SELECT reltuples::bigint FROM pg_class WHERE relname = 'upload'")).scalar()
+        if estimate is not None and estimate >= 0:  # -1 until the table is first analyzed
+            return estimate
+    return conn.execute(db.select(db.func.count()).select_from(Upload)).scalar()
 
 @app.route('/health')
 def health_check():
+    global _health_cache
+    checked_at, cached_payload = _health_cache
+    if cached_payload is not None and time.time() - checked_at < HEALTH_CACHE_TTL:
+        return ojsonify(cached_payload)
+    
     db_status = "disconnected"
     cloudinary_status = "disconnected"
+    upload_count = 0
     
     try:
-        db.session.execute(text('SELECT 1'))
-        db_status = "connected"
+        # Plain pooled connection; no ORM session needed for a probe
+        with db.engine.connect() as conn:
+            conn.execute(text('SELECT 1'))
+            db_status = "connected"
+            upload_count = estimated_upload_count(conn)
     except Exception as e:
-        app.logger.warning(f"Database health check failed: {e}")
+        app.logger.warning("Database health check failed: %s", e)
     
-    try:
-        cloudinary.api.ping()
+    if cloudinary_reachable():
         cloudinary_status = "connected"
-    except Exception as e:
-        app.logger.warning(f"Cloudinary health check failed: {e}")
-    
-    upload_count = 0
-    try:
-        upload_count = Upload.query.count()
-    except:
-        pass
     
     health_status = "healthy" if db_status == "connected" and cloudinary_status == "connected" else "degraded"
     
-    return jsonify({
+    payload = {
         "status": health_status,
         "database": db_status,
         "cloudinary": cloudinary_status,
         "upload_count": upload_count,
         "version": "2.2.0",
-        "timestamp": datetime.utcnow().isoformat()
-    })
+        "timestamp": datetime.utcnow()
+    }
+    if health_status == "healthy":
+        _health_cache = (time.time(), payload)
+    
+    return ojsonify(payload)
 
 # Error handlers
 @app.errorhandler(404)
 def not_found(e):
-    return jsonify({
-        "error": "Page not found", 
-        "code": "NOT_FOUND",
-        "available_endpoints": ["/", "/upload", "/gallery", "/health", "/stats", "/api"]
-    }), 404
+    return Response(NOT_FOUND_BYTES, status=404, mimetype="application/json")
 
 @app.errorhandler(413)
 def file_too_large(e):
-    return jsonify({
-        "error": "File too large. Maximum size is 16MB",
-        "code": "FILE_TOO_LARGE"
-    }), 413
+    return Response(FILE_TOO_LARGE_BYTES, status=413, mimetype="application/json")
 
 @app.errorhandler(429)
 def rate_limit_exceeded(e):
-    return jsonify({
-        "error": "Too many uploads. Please wait before trying again.",
-        "code": "RATE_LIMIT_EXCEEDED",
-        "retry_after": "60 seconds"
-    }), 429
+    return Response(RATE_LIMIT_EXCEEDED_BYTES, status=429, mimetype="application/json")
 
 @app.errorhandler(500)
 def internal_server_error(e):
-    app.logger.error(f"Internal server error: {e}")
-    return jsonify({
-        "error": "Internal server error. Please try again later.",
-        "code": "INTERNAL_ERROR"
-    }), 500
+    app.logger.error("Internal server error: %s", e)
+    return Response(INTERNAL_ERROR_BYTES, status=500, mimetype="application/json")
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     debug_mode = os.environ.get('FLASK_ENV') == 'development'
-    app.run(host='0.0.0.0', port=port, debug=debug_mode)
+    # The dev server handles one request at a time; serve real traffic with
+    # gunicorn (gevent workers, see gunicorn.conf.py):
+    #   gunicorn app:app -c gunicorn.conf.py
+    if debug_mode:
+        app.run(host='0.0.0.0', port=port, debug=True)
+    else:
+        app.logger.error("Refusing to start the development server outside FLASK_ENV=development; run: gunicorn app:app -c gunicorn.conf.py")
 
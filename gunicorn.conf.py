@@ -0,0 +1,43 @@
+# Gunicorn settings shared by the Procfile and render.yaml start commands
+import multiprocessing
+import os
+import subprocess
+import sys
+
+# gevent workers: the upload path mostly waits on Cloudinary and Postgres, so
+# one process can keep many requests in flight instead of one per worker
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gevent")
+# 2*CPU+1 keeps every core busy while some workers sit in CPU-bound image work.
+# Count the CPUs this process may run on, not the host's; under a CPU quota
+# set WEB_CONCURRENCY explicitly. Each worker holds its own database pool
+# (DB_POOL_SIZE + DB_MAX_OVERFLOW connections).
+cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else multiprocessing.cpu_count()
+workers = int(os.environ.get("WEB_CONCURRENCY", 2 * cpus + 1))
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+worker_connections = 1000
+timeout = 120
+keepalive = 5
+max_requests = 1000
+
+# Not preloaded: each worker imports app.py after gevent has monkey-patched
+# it, so the locks, queues and connection pools created at import cooperate
+# with the event loop instead of blocking it
+preload_app = False
+
+def on_starting(server):
+    # Create/upgrade the schema once per deploy rather than in every worker,
+    # which would all contend for the same table locks at boot
+    if os.environ.get("RUN_MIGRATIONS", "1") == "1":
+        result = subprocess.run(
+            [sys.executable, "-m", "flask", "--app", "app", "init-db"],
+            env={**os.environ, "RUN_MIGRATIONS": "0"}
+        )
+        if result.returncode != 0:
+            server.log.warning("Database initialization failed; starting anyway")
+        os.environ["RUN_MIGRATIONS"] = "0"
+
+def post_fork(server, worker):
+    if worker_class == "gevent":
+        # psycopg2 is a C extension; make its socket waits yield to the hub too
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()